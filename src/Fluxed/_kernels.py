@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+
+# Compiled kernels for the hot loops in NdShape.
+# Numba is an optional dependency: without it the kernels are plain Python
+# functions and callers should prefer their NumPy/SciPy code paths.
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """Fallback decorator that leaves the function uncompiled."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def gaussian_flux_nd(interior_unravel_2d, coord_arrays_tuple, means, inv_two_vars, norms):
+    """
+    Sums an axis-aligned N-D Gaussian over the interior cells in a single pass.
+
+    The value at a cell is prod_j norms[j] * exp(-inv_two_vars[j] * (c_j - means[j])**2),
+    where c_j is the coordinate of the cell along axis j.
+
+    Args:
+        interior_unravel_2d (np.ndarray): int64 array of shape (ndim, n_interior) with the
+                                          per-axis index of every interior cell.
+        coord_arrays_tuple (tuple): One contiguous float64 coordinate array per axis.
+        means (np.ndarray): float64 mean along each axis.
+        inv_two_vars (np.ndarray): float64 1 / (2 * stddev**2) along each axis.
+        norms (np.ndarray): float64 normalization constant along each axis.
+
+    Returns:
+        float: The flux over the interior cells.
+    """
+    ndim, n_interior = interior_unravel_2d.shape
+    acc = 0.0
+    for i in prange(n_interior):
+        exponent = 0.0
+        for j in range(ndim):
+            d = coord_arrays_tuple[j][interior_unravel_2d[j, i]] - means[j]
+            exponent += inv_two_vars[j] * d * d
+        acc += math.exp(-exponent)
+
+    norm = 1.0
+    for j in range(ndim):
+        norm *= norms[j]
+    return norm * acc
+
+
+# Full-grid Gaussian fills, specialized per dimension so the axis loops are
+# fixed and the arguments are plain arrays and scalars. The Gaussian factorizes
+# per axis, so exp() runs once per coordinate rather than once per cell.
+
+@njit(parallel=True, fastmath=True, cache=True)
+def gaussian_fill_1d(coord_x, out, mean_x, inv_two_var_x, norm):
+    """
+    Writes norm * exp(-inv_two_var_x * (x - mean_x)**2) into the 1D array `out`.
+    """
+    for i in prange(coord_x.size):
+        dx = coord_x[i] - mean_x
+        out[i] = norm * math.exp(-inv_two_var_x * dx * dx)
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def gaussian_fill_2d(coord_x, coord_y, out, mean_x, mean_y, inv_two_var_x, inv_two_var_y, norm):
+    """
+    Writes the axis-aligned 2D Gaussian at every (x, y) cell into the 2D array `out`.
+    """
+    factor_y = np.empty(coord_y.size)
+    for j in range(coord_y.size):
+        dy = coord_y[j] - mean_y
+        factor_y[j] = math.exp(-inv_two_var_y * dy * dy)
+
+    for i in prange(coord_x.size):
+        dx = coord_x[i] - mean_x
+        factor_x = norm * math.exp(-inv_two_var_x * dx * dx)
+        for j in range(coord_y.size):
+            out[i, j] = factor_x * factor_y[j]
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def gaussian_fill_3d(coord_x, coord_y, coord_z, out, mean_x, mean_y, mean_z,
+                     inv_two_var_x, inv_two_var_y, inv_two_var_z, norm):
+    """
+    Writes the axis-aligned 3D Gaussian at every (x, y, z) cell into the 3D array `out`.
+    """
+    factor_y = np.empty(coord_y.size)
+    for j in range(coord_y.size):
+        dy = coord_y[j] - mean_y
+        factor_y[j] = math.exp(-inv_two_var_y * dy * dy)
+    factor_z = np.empty(coord_z.size)
+    for k in range(coord_z.size):
+        dz = coord_z[k] - mean_z
+        factor_z[k] = math.exp(-inv_two_var_z * dz * dz)
+
+    for i in prange(coord_x.size):
+        dx = coord_x[i] - mean_x
+        factor_x = norm * math.exp(-inv_two_var_x * dx * dx)
+        for j in range(coord_y.size):
+            factor_xy = factor_x * factor_y[j]
+            for k in range(coord_z.size):
+                out[i, j, k] = factor_xy * factor_z[k]
@@ -1,8 +1,74 @@
+import functools
+import math
+import weakref
+from typing import Callable, Optional
+
 import numpy as np
 
 # This file contains the implementation of various probability distributions
 # Custom distributions can inherit from the Distribution class
 
+# Arrays larger than this are evaluated with numexpr (if installed), which runs
+# the expression multi-threaded in cache-sized blocks
+_NUMEXPR_MIN_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def _numexpr():
+    """
+    Lazily imports numexpr, an optional dependency. Returns None if unavailable.
+    """
+    try:
+        import numexpr
+    except ImportError:
+        return None
+    return numexpr
+
+
+def _use_numexpr(*arrays) -> bool:
+    """
+    Whether an expression over `arrays` is large enough to route through numexpr.
+    """
+    if not all(isinstance(a, np.ndarray) for a in arrays) or _numexpr() is None:
+        return False
+    return math.prod(np.broadcast_shapes(*(a.shape for a in arrays))) > _NUMEXPR_MIN_SIZE
+
+
+def _numexpr_evaluate(expression: str, arrays: dict, constants: dict) -> np.ndarray:
+    """
+    Evaluates `expression` with numexpr. The scalar constants are cast to the float type
+    NumPy would give the arrays, so the result has the same dtype as the equivalent NumPy
+    expression (e.g. float32 in, float32 out) instead of always float64.
+    """
+    float_type = np.result_type(*arrays.values(), 1.0).type
+    local_dict = dict(arrays)
+    local_dict.update((name, float_type(value)) for name, value in constants.items())
+    return _numexpr().evaluate(expression, local_dict=local_dict)
+
+
+# Variable names per function object, so repeated constructions with the same
+# function skip the __code__ introspection
+_VARS_CACHE: "weakref.WeakKeyDictionary[Callable, tuple]" = weakref.WeakKeyDictionary()
+
+
+def _function_vars(func: Callable) -> tuple:
+    """
+    Returns the positional parameter names of `func`, cached per function object.
+    Non-function callables without `__code__` yield an empty tuple.
+    """
+    try:
+        return _VARS_CACHE[func]
+    except (KeyError, TypeError):
+        pass
+    code = getattr(func, "__code__", None)
+    func_vars = code.co_varnames[: code.co_argcount] if code is not None else ()
+    try:
+        _VARS_CACHE[func] = func_vars
+    except TypeError:
+        # Objects that do not support weak references are not cached
+        pass
+    return func_vars
+
 
 class Distribution:
     """
@@ -10,17 +76,30 @@ class Distribution:
     This class provides a common interface for all distributions.
     It should be inherited by all custom distributions.
 
+    NdShape caches intensities and fluxes per distribution. Custom distributions should
+    expose their parameters as public, hashable attributes so that a changed parameter
+    gives a new cache key; otherwise call `NdShape.invalidate_cache()` after changing
+    them.
+
     Attributes:
         name (str): The name of the distribution.
         func (callable): The function that defines the distribution.
         vars (tuple): The variable names for the parameters of the distribution from func.
+                      Subclasses may declare it as a class attribute to skip the
+                      introspection of func on every construction.
     """
 
+    # Constructor arguments captured by func. The built-in distributions set this so
+    # that instances with equal parameters can share cached results.
+    _func_params: Optional[tuple] = None
+
     def __init__(self, name: str, func: callable):
         self.name: str = name
         self.func: callable = func
-        # Get parameter names from the function signature
-        self.vars = func.__code__.co_varnames[: func.__code__.co_argcount]
+        # Get parameter names from the function signature, unless the subclass
+        # declares them as a class attribute
+        if getattr(type(self), "vars", None) is None:
+            self.vars = _function_vars(func)
         self._validate()
 
     def _validate(self):
@@ -32,9 +111,44 @@ class Distribution:
         Call the distribution function with the provided arguments.
         This method allows both positional and keyword arguments to be passed
         to the underlying numpy-compatible function.
+        Built-in subclasses override this with a fixed signature that calls their
+        function directly, avoiding the *args/**kwargs packing on every evaluation.
         """
         return self.func(*args, **kwargs)
 
+    def _cache_key(self):
+        """
+        Hashable value identifying what func computes, used by NdShape to key cached
+        intensities and fluxes. This is `_func_params` when set, and otherwise the
+        function object itself, since the attributes of a custom distribution need
+        not determine what its function computes.
+        """
+        return self._func_params if self._func_params is not None else self.func
+
+    def components(self):
+        """
+        Per-axis factors of a separable distribution.
+
+        Distributions whose value factorizes as f(x, y, ...) = f_x(x) * f_y(y) * ...
+        can override this to return the list of 1D factor callables, one per axis.
+        Grids are then filled as an outer product of 1D evaluations instead of a
+        dense N-D evaluation.
+
+        Returns:
+            list[callable] | None: The per-axis factors, or None if not separable.
+        """
+        return None
+
+    def _numba_kernel(self):
+        """
+        Parameters for the compiled Gaussian flux kernel in `Fluxed._kernels`.
+
+        Returns:
+            tuple | None: (means, inv_two_vars, norms) float64 arrays with one entry per
+                          axis, or None if the distribution is not an axis-aligned Gaussian.
+        """
+        return None
+
     def __str__(self):
         return f"Distribution(name='{self.name}', vars={self.vars})"
 
@@ -45,24 +159,62 @@ class Distribution:
 class NormalDistribution1D(Distribution):
     """
     Normal distribution in 1D.
+
+    Raises:
+        ValueError: If `stddev` is not positive.
     """
 
+    vars = ("x",)
+
     def __init__(self, mean: float = 0.0, stddev: float = 1.0):
+        if not stddev > 0:
+            raise ValueError(f"stddev must be positive. Found: {stddev}")
+        # Precompute the constants once so each call is a single vectorized
+        # np.exp over the whole input array; squares are explicit products rather than pow.
+        inv_two_var = 0.5 / (stddev * stddev)
+        norm = 1.0 / (stddev * math.sqrt(2 * math.pi))
+
         def normal_func(x):
-            return (1 / (stddev * np.sqrt(2 * np.pi))) * np.exp(
-                -0.5 * ((x - mean) / stddev) ** 2
-            )
+            if _use_numexpr(x):
+                return _numexpr_evaluate(
+                    "norm * exp(-inv_two_var * (x - mean) ** 2)",
+                    {"x": x}, {"norm": norm, "inv_two_var": inv_two_var, "mean": mean},
+                )
+            d = x - mean
+            return norm * np.exp(-inv_two_var * (d * d))
 
         super().__init__("NormalDistribution1D", normal_func)
+        self._func_params = (mean, stddev)
+        self._kernel_constants = (mean, inv_two_var, norm)
+        self._func_impl = normal_func
         self.mean = mean
         self.stddev = stddev
 
+    def __call__(self, x):
+        return self._func_impl(x)
+
+    def _numba_kernel(self):
+        if type(self).__call__ is not NormalDistribution1D.__call__:
+            return None
+        # The constants captured by normal_func, so both paths evaluate the same Gaussian
+        mean, inv_two_var, norm = self._kernel_constants
+        return (
+            np.array([mean], dtype=np.float64),
+            np.array([inv_two_var], dtype=np.float64),
+            np.array([norm], dtype=np.float64),
+        )
+
 
 class NormalDistribution2D(Distribution):
     """
     Normal distribution in 2D.
+
+    Raises:
+        ValueError: If `stddev_x` or `stddev_y` is not positive.
     """
 
+    vars = ("x", "y")
+
     def __init__(
         self,
         mean_x: float = 0.0,
@@ -70,23 +222,75 @@ class NormalDistribution2D(Distribution):
         stddev_x: float = 1.0,
         stddev_y: float = 1.0,
     ):
+        if not (stddev_x > 0 and stddev_y > 0):
+            raise ValueError(
+                f"stddev_x and stddev_y must be positive. Found: {stddev_x}, {stddev_y}")
+        # Precompute the constants once; squares are explicit products rather than pow
+        norm = 1.0 / (2 * math.pi * stddev_x * stddev_y)
+        inv_two_var_x = 0.5 / (stddev_x * stddev_x)
+        inv_two_var_y = 0.5 / (stddev_y * stddev_y)
+
         def normal_func(x, y):
-            return (1 / (2 * np.pi * stddev_x * stddev_y)) * np.exp(
-                -0.5 * (((x - mean_x) / stddev_x) ** 2 + ((y - mean_y) / stddev_y) ** 2)
-            )
+            if _use_numexpr(x, y):
+                return _numexpr_evaluate(
+                    "norm * exp(-(inv_two_var_x * (x - mean_x) ** 2"
+                    " + inv_two_var_y * (y - mean_y) ** 2))",
+                    {"x": x, "y": y},
+                    {
+                        "norm": norm,
+                        "inv_two_var_x": inv_two_var_x, "inv_two_var_y": inv_two_var_y,
+                        "mean_x": mean_x, "mean_y": mean_y,
+                    },
+                )
+            dx = x - mean_x
+            dy = y - mean_y
+            return norm * np.exp(-(inv_two_var_x * (dx * dx) + inv_two_var_y * (dy * dy)))
 
         super().__init__("NormalDistribution2D", normal_func)
+        self._func_params = (mean_x, mean_y, stddev_x, stddev_y)
+        self._kernel_constants = (mean_x, mean_y, inv_two_var_x, inv_two_var_y, norm)
+        self._func_impl = normal_func
         self.mean_x = mean_x
         self.mean_y = mean_y
         self.stddev_x = stddev_x
         self.stddev_y = stddev_y
 
+    def __call__(self, x, y):
+        return self._func_impl(x, y)
+
+    def components(self):
+        """
+        The 2D normal distribution is the product of two independent 1D normals.
+        """
+        if type(self).__call__ is not NormalDistribution2D.__call__:
+            # A subclass changed how inputs map to axes, so the factors may not apply.
+            return None
+        # Built from the parameters captured by normal_func, not the public attributes
+        mean_x, mean_y, stddev_x, stddev_y = self._func_params
+        return [
+            NormalDistribution1D(mean_x, stddev_x).func,
+            NormalDistribution1D(mean_y, stddev_y).func,
+        ]
+
+    def _numba_kernel(self):
+        if type(self).__call__ is not NormalDistribution2D.__call__:
+            return None
+        # The constants captured by normal_func; the joint norm is applied once
+        mean_x, mean_y, inv_two_var_x, inv_two_var_y, norm = self._kernel_constants
+        return (
+            np.array([mean_x, mean_y], dtype=np.float64),
+            np.array([inv_two_var_x, inv_two_var_y], dtype=np.float64),
+            np.array([norm, 1.0], dtype=np.float64),
+        )
+
 
 class UniformDistribution(Distribution):
     """
     Uniform distribution in Nd.
     """
 
+    vars = ()
+
     def __init__(self, value: float = 1.0):
         def uniform_func(*args) -> float:
             if args and isinstance(args[0], np.ndarray):
@@ -97,6 +301,7 @@ class UniformDistribution(Distribution):
                 return value
 
         super().__init__("UniformDistribution", uniform_func)
+        self._func_params = (value,)
         self.value = value
 
 
@@ -105,6 +310,8 @@ class LinearDistribution1D(Distribution):
     Linear distribution in 1D.
     """
 
+    vars = ("x",)
+
     def __init__(
         self, slope: float = 1.0, intercept: float = 0.0, domain: tuple = (0.0, 1.0)
     ):
@@ -112,16 +319,23 @@ class LinearDistribution1D(Distribution):
             return slope * x + intercept
 
         super().__init__("LinearDistribution1D", linear_func)
+        self._func_params = (slope, intercept)
+        self._func_impl = linear_func
         self.slope = slope
         self.intercept = intercept
         self.domain = domain
 
+    def __call__(self, x):
+        return self._func_impl(x)
+
 
 class LinearDistribution2D(Distribution):
     """
     Linear distribution in 2D.
     """
 
+    vars = ("x", "y")
+
     def __init__(
         self,
         slope_x: float = 1.0,
@@ -134,32 +348,46 @@ class LinearDistribution2D(Distribution):
             return slope_x * x + slope_y * y + intercept_x + intercept_y
 
         super().__init__("LinearDistribution2D", linear_func)
+        self._func_params = (slope_x, slope_y, intercept_x, intercept_y)
+        self._func_impl = linear_func
         self.slope_x = slope_x
         self.slope_y = slope_y
         self.intercept_x = intercept_x
         self.intercept_y = intercept_y
         self.domain = domain
 
+    def __call__(self, x, y):
+        return self._func_impl(x, y)
+
 
 class ExponentialDistribution1D(Distribution):
     """
     Exponential distribution in 1D.
     """
 
+    vars = ("x",)
+
     def __init__(self, rate: float = 1.0, domain: tuple = (0.0, 1.0)):
         def exponential_func(x) -> float:
             return rate * np.exp(-rate * x)
 
         super().__init__("ExponentialDistribution1D", exponential_func)
+        self._func_params = (rate,)
+        self._func_impl = exponential_func
         self.rate = rate
         self.domain = domain
 
+    def __call__(self, x):
+        return self._func_impl(x)
+
 
 class ExponentialDistribution2D(Distribution):
     """
     Exponential distribution in 2D.
     """
 
+    vars = ("x", "y")
+
     def __init__(
         self,
         rate_x: float = 1.0,
@@ -170,6 +398,11 @@ class ExponentialDistribution2D(Distribution):
             return rate_x * np.exp(-rate_x * x) * rate_y * np.exp(-rate_y * y)
 
         super().__init__("ExponentialDistribution2D", exponential_func)
+        self._func_params = (rate_x, rate_y)
+        self._func_impl = exponential_func
         self.rate_x = rate_x
         self.rate_y = rate_y
         self.domain = domain
+
+    def __call__(self, x, y):
+        return self._func_impl(x, y)
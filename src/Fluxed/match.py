@@ -68,6 +68,10 @@ def match_flux_parameters(
             "target_flux": target_flux,
         }
 
+    # Bind the target shape and coordinates once, so each iteration only builds the
+    # distribution from its parameters and evaluates the flux.
+    target_flux_function = target_shape.bind(*target_coords_arrays)
+
     # Define the objective function for the optimizer
     # This function takes a vector of parameters 'p' and returns the squared error.
     # It uses a closure to "remember" the other necessary variables.
@@ -86,7 +90,7 @@ def match_flux_parameters(
             return 1e12  # Return a large penalty
 
         # Calculate the flux for this new distribution
-        current_flux = target_shape.get_flux(current_dist, *target_coords_arrays)
+        current_flux = target_flux_function(current_dist)
 
         # Calculate and return the squared difference
         error = (current_flux - target_flux) ** 2
@@ -2,10 +2,63 @@ import numpy as np
 import scipy.ndimage
 
 from Fluxed.distributions import Distribution
+from Fluxed._kernels import (
+    NUMBA_AVAILABLE,
+    gaussian_fill_1d,
+    gaussian_fill_2d,
+    gaussian_fill_3d,
+    gaussian_flux_nd,
+)
 
 import functools
 import warnings
-from typing import Optional, Tuple, Any
+from typing import Any, Callable, Optional, Tuple
+
+# Maximum number of intensity arrays (and of fluxes) kept per shape
+_INTENSITY_CACHE_SIZE = 8
+
+# Compiled full-grid Gaussian fills by number of dimensions
+_GAUSSIAN_FILL_KERNELS = {1: gaussian_fill_1d, 2: gaussian_fill_2d, 3: gaussian_fill_3d}
+
+# Interiors covering less than 1/_SPARSE_INTERIOR_RATIO of the grid are summed by
+# gathering their flat indices instead of a masked reduction over the whole grid
+_SPARSE_INTERIOR_RATIO = 8
+
+# Largest magnitude of a quantized (int16) intensity value
+_INT16_MAX = np.iinfo(np.int16).max
+
+
+def _quantize_int16(values: np.ndarray) -> Tuple[np.ndarray, Optional[float]]:
+    """
+    Quantizes intensities to int16 with a scale chosen so the peak magnitude maps
+    to 32767. Arrays with non-finite values are returned unchanged with no scale.
+    """
+    peak = float(np.max(np.abs(values))) if values.size else 0.0
+    if not np.isfinite(peak):
+        return values, None
+    scale = peak / _INT16_MAX if peak > 0 else 1.0
+    return np.rint(values / scale).astype(np.int16), scale
+
+
+def _is_binary(array: np.ndarray) -> bool:
+    """
+    Checks that an array holds only 0s and 1s in one vectorized pass, without sorting.
+    """
+    kind = array.dtype.kind
+    if kind == 'b':
+        return True
+    if kind in 'iu':
+        # Any bit other than the lowest one set (including the sign bit) rules out 0/1
+        return not (array & ~array.dtype.type(1)).any()
+    return not ((array != 0) & (array != 1)).any()
+
+
+# Marker for distribution IDs that cannot be cached by value
+_UNCACHEABLE = object()
+
+# Cache key prefix for intensity vectors evaluated only at interior cells
+_INTERIOR = object()
+
 
 # --- NdShape Class ---
 class NdShape:
@@ -18,48 +71,97 @@ class NdShape:
     intensity is determined by a provided Distribution object.
 
     Attributes:
-        _shape_array (np.ndarray): The N-dimensional array defining the shape's border.
+        _shape_array (np.ndarray): The N-dimensional array defining the shape's border,
+                                   stored as a contiguous bool array.
         _intensity_array (np.ndarray): Stores the computed intensity values across the
                                        entire shape domain, populated by `fill_intensity_array`.
-        _current_distribution_id (str): A simple identifier for the last used distribution
-                                        for internal caching purposes.
+                                       Its element type is set by the `dtype` argument,
+                                       or int16 when `quantize=True`.
+        _intensity_scale (float): Multiplier that converts a quantized intensity array
+                                  back to intensities, or None if not quantized.
+        _intensity_interior (np.ndarray): Intensity values at the enclosed cells only
+                                          (ordered like `_interior_indices`), populated
+                                          by `get_flux`.
+        _current_distribution_id (tuple): A hashable identifier (name, coordinate hashes,
+                                          parameters) for the last used distribution,
+                                          for internal caching purposes.
+        _intensity_cache (dict): Recently computed intensity arrays keyed by
+                                 distribution ID, so repeated calls skip recomputation.
+        _flux_cache (dict): Recently computed fluxes keyed by distribution ID.
+        _interior_mask (np.ndarray): Cached boolean mask of the enclosed region.
+        _interior_indices (np.ndarray): Cached flat indices of the enclosed region.
 
     Properties:
-        shape_array (np.ndarray): Returns the underlying NumPy array defining the border.
+        shape_array (np.ndarray): Returns the underlying bool array defining the border.
         dimensions (int): Returns the number of dimensions of the shape.
         is_closed (bool): Checks and caches whether the shape's border encloses a region.
     """
 
-    def __init__(self, shape_array: np.ndarray) -> None:
+    def __init__(self, shape_array: np.ndarray, dtype: np.dtype = np.float64,
+                 quantize: bool = False) -> None:
         """
         Initializes the NdShape with a given NumPy array defining the border.
 
         Args:
             shape_array (np.ndarray): The N-dimensional array representing the shape's border.
                                       1s represent border points, 0s represent empty space.
+            dtype (np.dtype, optional): Floating-point type of the stored intensity array.
+                                        Defaults to float64. Pass np.float32 to halve the
+                                        memory traffic on large grids; flux sums are always
+                                        accumulated in float64. Avoid float32 with
+                                        gradient-based flux matching, as finite-difference
+                                        steps fall below its resolution.
+            quantize (bool, optional): If True, full intensity grids are stored as int16
+                                       with a per-array scale (peak / 32767), a quarter of
+                                       the float64 memory, and summed as exact integers.
+                                       Values carry a relative error of up to ~1.5e-5 of
+                                       the peak. Defaults to False. `get_flux` then always
+                                       fills and sums the quantized grid instead of
+                                       evaluating only the interior cells.
 
         Raises:
             TypeError: If the input 'shape_array' is not a NumPy array.
-            ValueError: If the array contains values other than 0 or 1.
+            ValueError: If the array contains values other than 0 or 1, or if
+                        `dtype` is not a floating-point type.
         """
         if not isinstance(shape_array, np.ndarray):
             raise TypeError("Input 'shape_array' must be a NumPy array.")
 
-        unique_values = np.unique(shape_array)
-        if not np.all(np.isin(unique_values, [0, 1])):
+        # Single vectorized pass instead of sorting with np.unique; the unique
+        # values are only computed for the error message.
+        if not _is_binary(shape_array):
             raise ValueError(
-                f"Shape array must contain only 0s and 1s. Found: {unique_values}"
+                f"Shape array must contain only 0s and 1s. Found: {np.unique(shape_array)}"
             )
 
-        self._shape_array: np.ndarray = shape_array
+        self._dtype: np.dtype = np.dtype(dtype)
+        if self._dtype.kind != 'f':
+            raise ValueError(
+                f"Intensity dtype must be a floating-point type. Found: {self._dtype}")
+
+        # Only 0s and 1s are stored, so one byte per cell is enough; bool also feeds
+        # the mask operations (&, ~, binary_fill_holes) without conversion.
+        self._shape_array: np.ndarray = np.ascontiguousarray(shape_array, dtype=np.bool_)
+        self._quantize: bool = bool(quantize)
         self._intensity_array: Optional[np.ndarray] = None  # No intensity array initially
+        # Scale of a quantized (int16) intensity array; None when stored as floats
+        self._intensity_scale: Optional[float] = None
+        # Intensity values at the interior cells only, as computed by `get_flux`
+        self._intensity_interior: Optional[np.ndarray] = None
+        # Distribution and coordinate grids behind the current intensity values
+        self._current_setup: Optional[Tuple[Distribution, list]] = None
         # Tracks the distribution used to fill intensity
         self._current_distribution_id: Optional[Tuple[Any, ...]] = None
+        # Recently computed intensity arrays, keyed by distribution ID
+        self._intensity_cache: dict = {}
+        # Recently computed fluxes, keyed by distribution ID
+        self._flux_cache: dict = {}
 
     @property
     def shape_array(self) -> np.ndarray:
         """
-        Returns the underlying NumPy array representing the shape's border definition.
+        Returns the underlying NumPy array representing the shape's border definition,
+        as a bool array (True for border points). Use `.view(np.uint8)` for 0/1 integers.
         """
         return self._shape_array
 
@@ -80,47 +182,51 @@ class NdShape:
         Returns:
             bool: True if the shape contains at least one enclosed region, False otherwise.
         """
+        # A 0-cell is enclosed exactly when filling the holes of the border turns it
+        # into a 1, so any interior cell means the shape is closed.
+        return bool(self._interior_mask.any())
+
+    @functools.cached_property
+    def _interior_mask(self) -> np.ndarray:
+        """
+        Boolean mask of the enclosed region: cells that were originally 0 but are
+        filled by `scipy.ndimage.binary_fill_holes`. Computed once in a single C pass
+        and reused by `is_closed`, `get_flux` and `get_enclosed_intensity_array`.
+        """
+        border = self._shape_array
+        filled = scipy.ndimage.binary_fill_holes(border)
+        return filled & ~border
+
+    @functools.cached_property
+    def _interior_indices(self) -> np.ndarray:
+        """
+        Flat (C-order) indices of the enclosed cells. Gathering with these touches
+        only the interior instead of sweeping a boolean mask over the whole array.
+        """
+        return np.flatnonzero(self._interior_mask)
+
+    @functools.cached_property
+    def _interior_unravelled(self) -> Tuple[np.ndarray, ...]:
+        """
+        Per-axis indices of the enclosed cells, matching `_interior_indices`. These are
+        views of the rows of `_interior_unravelled_2d`, so the indices are stored once.
+        """
+        return tuple(self._interior_unravelled_2d)
+
+    @functools.cached_property
+    def _interior_unravelled_2d(self) -> np.ndarray:
+        """
+        Per-axis indices of the enclosed cells stacked into an int64 (ndim, n_interior)
+        array for the compiled kernels.
+        """
+        unravelled = np.unravel_index(self._interior_indices, self._shape_array.shape)
+        return np.stack(unravelled).astype(np.int64, copy=False)
 
-        # Label all connected components of '0's (empty space)
-        # `structure=scipy.ndimage.generate_binary_structure(self.dimensions, 1)`
-        # defines connectivity. `rank=1` means direct (face-connected) neighbors.
-        structure = scipy.ndimage.generate_binary_structure(self.dimensions, 1)
-        labeled_regions, num_features = scipy.ndimage.label(
-            self._shape_array == 0, structure=structure)
-
-        if num_features == 0:
-            # No empty space at all, so no enclosed regions.
-            return False
-
-        # Identify labels that touch the array boundaries
-        boundary_labels = set()
-        shape_dims = self._shape_array.shape
-
-        # Use np.nditer for efficient iteration over N-dimensional array indices
-        it = np.nditer(self._shape_array, flags=['multi_index'])
-        while not it.finished:
-            idx = it.multi_index
-            is_on_boundary = False
-            for d in range(self.dimensions):
-                # Check if current index is on any dimension's boundary
-                if idx[d] == 0 or idx[d] == shape_dims[d] - 1:
-                    is_on_boundary = True
-                    break
-
-            # If it's a boundary 0
-            if is_on_boundary and self._shape_array[idx] == 0:
-                boundary_labels.add(labeled_regions[idx])
-            it.iternext()
-
-        # If there's any labeled region of 0s that *doesn't* touch the boundary,
-        # then it's an enclosed region, and the shape is closed.
-        return num_features > len(boundary_labels)
-
-    @functools.lru_cache(maxsize=None)
     def _get_flux_internal(self, distribution_id_tuple: Tuple[Any, ...]) -> float:
         """
-        Internal cached method to compute flux. Assumes _intensity_array is populated
-        correctly for the given distribution_id_tuple.
+        Internal cached method to compute flux. Assumes _intensity_interior or
+        _intensity_array is populated correctly for the given distribution_id_tuple.
+        Fluxes are kept per shape in the bounded `_flux_cache`.
 
         Args:
             distribution_id_tuple (tuple): A unique, hashable identifier for the
@@ -129,26 +235,49 @@ class NdShape:
         Returns:
             float: The computed flux.
         """
+        cached = self._flux_cache.get(distribution_id_tuple)
+        if cached is not None:
+            return cached
+
         # This check should ideally not be hit if `get_flux` is called correctly,
-        # as `get_flux` ensures `_intensity_array` and `_current_distribution_id`
+        # as `get_flux` ensures the intensity values and `_current_distribution_id`
         # are in sync before calling this cached method.
-        if self._intensity_array is None or self._current_distribution_id != distribution_id_tuple:
+        if not self._has_intensity() or self._current_distribution_id != distribution_id_tuple:
             raise RuntimeError(
                 "Intensity array not correctly populated or synced with cache key. "
                 "This indicates an internal caching or state management issue."
             )
 
-        # Identify the interior points: cells that were originally 0 but are filled by holes.
-        filled_array = scipy.ndimage.binary_fill_holes(self._shape_array)
-        interior_mask = (filled_array == 1) & (self._shape_array == 0)
+        if self._intensity_interior is not None:
+            # Values were only evaluated at the interior cells
+            flux = float(self._intensity_interior.sum(dtype=np.float64))
+        else:
+            # Sum intensities only within the identified interior region. A masked
+            # reduction (`where=`) applies the mask and sums in a single pass without a
+            # temporary; gathering by flat index is cheaper only for sparse interiors.
+            # Quantized grids are summed exactly as integers and scaled once.
+            acc_dtype = np.float64 if self._intensity_scale is None else np.int64
+            if self._interior_indices.size * _SPARSE_INTERIOR_RATIO < self._intensity_array.size:
+                total = np.take(self._intensity_array, self._interior_indices).sum(dtype=acc_dtype)
+            else:
+                total = self._intensity_array.sum(where=self._interior_mask, dtype=acc_dtype)
+            if self._intensity_scale is not None:
+                flux = self._intensity_scale * int(total)
+            else:
+                flux = float(total)
 
-        # Sum intensities only within the identified interior region
-        return float(np.sum(self._intensity_array[interior_mask]))
+        if distribution_id_tuple[2][1] is not _UNCACHEABLE:
+            if len(self._flux_cache) >= _INTENSITY_CACHE_SIZE:
+                del self._flux_cache[next(iter(self._flux_cache))]
+            self._flux_cache[distribution_id_tuple] = flux
+        return flux
 
     def fill_intensity_array(self, distribution: Distribution, *coords_arrays: np.ndarray) -> None:
         """
         Fills the shape's domain with intensity values from the given distribution.
         This method computes the `_intensity_array` which will be used for flux calculations.
+        Arrays are cached per distribution parameters and coordinates, so repeating a
+        previous setup reuses the stored array instead of re-evaluating the distribution.
 
         Args:
             distribution (Distribution): An instance of the Distribution class.
@@ -157,6 +286,14 @@ class NdShape:
                 must match the shape's dimensions. If no coordinate arrays are provided,
                 integer indices (0 to dim_size-1) are used for each dimension.
 
+        Note:
+            Vectorized distributions are called once with open grids from `np.ix_`
+            rather than dense meshgrids, so the coordinate for axis i has shape
+            (1, ..., dims[i], ..., 1). Distribution functions must therefore rely on
+            NumPy broadcasting between their inputs (e.g. `NormalDistribution2D` on
+            (x, y), or a 1D distribution applied only to z) instead of assuming
+            every input already has the full shape.
+
         Raises:
             TypeError: If `distribution` is not a `Distribution` instance.
             ValueError: If the number or shape of `coords_arrays` is incorrect.
@@ -165,6 +302,15 @@ class NdShape:
             raise TypeError(
                 "`distribution` must be an instance of the `Distribution` class.")
 
+        coord_grids = self._prepare_coord_grids(coords_arrays)
+        self._fill_intensity_array(
+            distribution, coord_grids, self._make_distribution_id(distribution, coord_grids))
+
+    def _prepare_coord_grids(self, coords_arrays: Tuple[np.ndarray, ...]) -> list:
+        """
+        Validates user-supplied coordinate arrays, or builds default integer indices
+        (0 to dim_size-1) for each dimension if none are provided.
+        """
         dims = self.shape_array.shape
         num_dims = self.dimensions
 
@@ -184,34 +330,111 @@ class NdShape:
                     )
                 coord_grids.append(c_arr)
         else:  # Use integer indices (0, 1, 2...) if no coordinate arrays provided
-            for d in range(num_dims):
-                coord_grids.append(np.arange(dims[d]))
+            coord_grids = self._default_coord_grids
+        return coord_grids
 
-        # Generate the N-D coordinate meshgrid for all points in the array
-        mesh_coords = np.meshgrid(*coord_grids, indexing='ij')
+    @functools.cached_property
+    def _default_coord_grids(self) -> list:
+        """
+        Integer index coordinates (0 to dim_size-1) per dimension, built once per shape.
+        """
+        return [np.arange(n) for n in self._shape_array.shape]
 
-        # Create a unique ID for the distribution + coordinates setup for caching
-        # This makes the cache key more robust than just distribution.name
-        # It hashes the coordinate arrays for uniqueness.
-        coord_hashes = tuple(hash(tuple(c.tolist())) for c in coord_grids)
-        self._current_distribution_id = (
-            distribution.name, coord_hashes)
+    def _make_distribution_id(self, distribution: Distribution, coord_grids: list) -> Tuple[Any, ...]:
+        """
+        Creates a unique, hashable ID for the distribution + coordinates setup.
+
+        The ID is (name, coord_hashes, params). `params` holds the distribution's
+        type, its cache key and its public attributes. Built-in distributions key on
+        the constructor arguments captured by their function, so two instances with
+        equal parameters share cached results; other distributions key on their
+        function object. If a parameter is unhashable, the instance identity is used
+        instead and the results are neither cached nor reused.
+
+        Changes to a custom distribution are therefore only seen if they show up in
+        its public, hashable attributes; state kept in private attributes or captured
+        by its function needs `invalidate_cache` after a change.
+        """
+        # It hashes the coordinate values for uniqueness, so arrays changed in place
+        # get a new ID. Hashing the raw bytes avoids building a Python tuple per array.
+        coord_hashes = tuple(hash((c.dtype.str, c.tobytes())) for c in coord_grids)
+        attributes = tuple(sorted(
+            (k, v) for k, v in distribution.__dict__.items()
+            if k not in ("name", "func", "vars") and not k.startswith("_")
+        ))
+        params = (type(distribution), distribution._cache_key(), attributes)
+        try:
+            hash(params)
+        except TypeError:
+            params = (type(distribution), _UNCACHEABLE, id(distribution))
+        return (distribution.name, coord_hashes, params)
+
+    def _fill_intensity_array(self, distribution: Distribution, coord_grids: list,
+                              distribution_id: Tuple[Any, ...]) -> None:
+        """
+        Populates `_intensity_array` for an already-validated setup, reusing a cached
+        array when the same distribution parameters and coordinates were seen before.
+        """
+        cached = self._intensity_cache.get(distribution_id)
+        if cached is not None:
+            intensity_values, intensity_scale = cached
+            self._set_current(distribution_id, distribution, coord_grids,
+                              intensity_array=intensity_values, intensity_scale=intensity_scale)
+            return
+
+        intensity_values = self._compute_intensity_array(distribution, coord_grids)
+        self._store_intensity_array(distribution_id, distribution, coord_grids, intensity_values)
+
+    def _compute_intensity_array(self, distribution: Distribution, coord_grids: list) -> np.ndarray:
+        """
+        Evaluates the distribution over the full grid, without quantizing or caching.
+        """
+        dims = self.shape_array.shape
+        num_dims = self.dimensions
+
+        # Axis-aligned Gaussians in 1-3 dimensions are written straight into the
+        # output by a compiled kernel specialized for that dimension.
+        kernel_params = distribution._numba_kernel() if NUMBA_AVAILABLE else None
+        fill_kernel = _GAUSSIAN_FILL_KERNELS.get(num_dims)
+        if kernel_params is not None and fill_kernel is not None and kernel_params[0].size == num_dims:
+            means, inv_two_vars, norms = kernel_params
+            intensity_values = np.empty(dims, dtype=self._dtype)
+            fill_kernel(
+                *(np.ascontiguousarray(c, dtype=np.float64) for c in coord_grids),
+                intensity_values,
+                *means.tolist(), *inv_two_vars.tolist(), float(np.prod(norms)),
+            )
+            return intensity_values
+
+        # Separable distributions: evaluate each 1D factor on its own axis and
+        # combine them with an outer product, so exp() runs O(sum(dims)) times
+        # instead of O(prod(dims)).
+        components = distribution.components()
+        if components is not None and len(components) == num_dims:
+            factors = [np.asarray(comp(c), dtype=self._dtype)
+                       for comp, c in zip(components, coord_grids)]
+            intensity_values = functools.reduce(np.multiply.outer, factors)
+            return intensity_values
+
+        # Build open (broadcastable) coordinate grids: axis i has shape
+        # (1, ..., dims[i], ..., 1), so only O(sum(dims)) coordinates are stored
+        # instead of N dense arrays of prod(dims) points each.
+        open_grids = np.ix_(*coord_grids)
 
         # Initialize raw intensity array
-        intensity_values = np.zeros(dims, dtype=float)
+        intensity_values = np.zeros(dims, dtype=self._dtype)
 
         # Attempt vectorized application of the distribution function
         try:
-            # Test if function supports vectorized input by passing small arrays
-            test_inputs = [np.array([1.0, 2.0], dtype=float)
-                           for _ in range(num_dims)]
-            test_output = distribution(*test_inputs)
-
-            if isinstance(test_output, np.ndarray) and test_output.shape == (2,):
-                # If it supports, flatten meshgrid coordinates and apply once
-                flattened_coords = [m.ravel() for m in mesh_coords]
-                intensity_values = distribution(
-                    *flattened_coords).reshape(dims)
+            if self._supports_vectorized(distribution):
+                # If it supports, apply once on the open grids and let NumPy
+                # broadcast. Distributions that ignore some axes return a
+                # lower-rank result, which is expanded to the full domain here.
+                intensity_values = np.asarray(
+                    distribution(*open_grids), dtype=self._dtype)
+                if intensity_values.shape != dims:
+                    intensity_values = np.broadcast_to(
+                        intensity_values, dims).copy()
             else:
                 # Fallback to element-wise application if not vectorized
                 raise TypeError(
@@ -234,11 +457,111 @@ class NdShape:
                 it.iternext()
 
         # Apply normalization if specified by the distribution
-        self._intensity_array = intensity_values
+        return intensity_values
+
+    def _store_intensity_array(self, distribution_id: Tuple[Any, ...], distribution: Distribution,
+                               coord_grids: list, intensity_values: np.ndarray) -> None:
+        """
+        Makes a freshly computed full grid current and caches it, quantizing it to
+        int16 first if the shape was created with `quantize=True`.
+        """
+        intensity_scale = None
+        if self._quantize:
+            intensity_values, intensity_scale = _quantize_int16(intensity_values)
+        self._set_current(distribution_id, distribution, coord_grids,
+                          intensity_array=intensity_values, intensity_scale=intensity_scale)
+        self._cache_put(distribution_id, (intensity_values, intensity_scale))
+
+    def _evaluate_interior(self, distribution: Distribution, coord_grids: list,
+                           distribution_id: Tuple[Any, ...]) -> None:
+        """
+        Evaluates the distribution only at the enclosed cells, storing the resulting
+        1D vector in `_intensity_interior`. Cells on the border or outside the shape
+        never reach the distribution function.
+
+        Distributions that do not accept array input fall back to the element-wise
+        full-grid fill of `_fill_intensity_array`.
+        """
+        cached = self._intensity_cache.get((_INTERIOR, distribution_id))
+        if cached is not None:
+            self._set_current(distribution_id, distribution, coord_grids, intensity_interior=cached)
+            return
 
-        # Invalidate the internal flux cache for all distribution IDs,
-        # as the underlying intensity array has now changed.
-        self._get_flux_internal.cache_clear()
+        num_interior = self._interior_indices.size
+        try:
+            if not self._supports_vectorized(distribution):
+                raise TypeError(
+                    "Distribution function does not appear to support vectorized input.")
+            # Gather the coordinate of every interior cell along each axis
+            coords_at_interior = [c[idx] for c, idx in zip(coord_grids, self._interior_unravelled)]
+            values = np.asarray(distribution(*coords_at_interior), dtype=self._dtype)
+            if values.shape != (num_interior,):
+                values = np.broadcast_to(values, (num_interior,)).copy()
+        except (TypeError, ValueError, IndexError, AttributeError):
+            self._fill_intensity_array(distribution, coord_grids, distribution_id)
+            return
+
+        self._set_current(distribution_id, distribution, coord_grids, intensity_interior=values)
+        self._cache_put(distribution_id, values, interior=True)
+
+    def _supports_vectorized(self, distribution: Distribution) -> bool:
+        """
+        Tests if the distribution function supports vectorized input by passing small arrays.
+        """
+        test_inputs = [np.array([1.0, 2.0], dtype=float)
+                       for _ in range(self.dimensions)]
+        test_output = distribution(*test_inputs)
+        return isinstance(test_output, np.ndarray) and test_output.shape == (2,)
+
+    def _set_current(self, distribution_id: Tuple[Any, ...], distribution: Distribution,
+                     coord_grids: list, intensity_array: Optional[np.ndarray] = None,
+                     intensity_interior: Optional[np.ndarray] = None,
+                     intensity_scale: Optional[float] = None) -> None:
+        """
+        Records the intensity values of the most recent evaluation. At most one of
+        `intensity_array` (full grid) or `intensity_interior` (enclosed cells only) is
+        given; neither is given when a compiled kernel computed the flux directly. The
+        distribution and coordinates are kept so the full grid can be materialized
+        later if it is requested. `intensity_scale` is set for quantized grids.
+        """
+        self._intensity_array = intensity_array
+        self._intensity_scale = intensity_scale
+        self._intensity_interior = intensity_interior
+        self._current_distribution_id = distribution_id
+        self._current_setup = (distribution, coord_grids)
+
+    def _cache_put(self, distribution_id: Tuple[Any, ...], values: Any,
+                   interior: bool = False) -> None:
+        """
+        Stores a full intensity grid as an (array, scale) pair, or with `interior=True`
+        an interior vector, in the bounded intensity cache.
+        """
+        if distribution_id[2][1] is _UNCACHEABLE:
+            return
+        key = (_INTERIOR, distribution_id) if interior else distribution_id
+        # Keep a bounded number of recent arrays; dicts preserve insertion order,
+        # so the first key is the oldest entry.
+        if len(self._intensity_cache) >= _INTENSITY_CACHE_SIZE:
+            del self._intensity_cache[next(iter(self._intensity_cache))]
+        self._intensity_cache[key] = values
+
+    def invalidate_cache(self) -> None:
+        """
+        Clears all cached intensity arrays and flux values for this shape, along with
+        the enclosed region derived from the shape array. Call this after mutating the
+        shape array in place.
+        """
+        # Drop the cached properties so they are recomputed from the current array
+        for name in ("is_closed", "_interior_mask", "_interior_indices",
+                     "_interior_unravelled", "_interior_unravelled_2d", "_default_coord_grids"):
+            self.__dict__.pop(name, None)
+        self._intensity_cache.clear()
+        self._intensity_array = None
+        self._intensity_scale = None
+        self._intensity_interior = None
+        self._current_distribution_id = None
+        self._current_setup = None
+        self._flux_cache.clear()
 
     def get_flux(self, distribution: Distribution, *coords_arrays: np.ndarray) -> float:
         """
@@ -267,16 +590,153 @@ class NdShape:
             )
             return 0.0
 
-        # Populate or re-populate the intensity array based on the distribution and coordinates
-        self.fill_intensity_array(distribution, *coords_arrays)
+        if not isinstance(distribution, Distribution):
+            raise TypeError(
+                "`distribution` must be an instance of the `Distribution` class.")
+
+        coord_grids = self._prepare_coord_grids(coords_arrays)
+        distribution_id = self._make_distribution_id(distribution, coord_grids)
 
-        # Retrieve flux from cache using the unique ID generated by fill_intensity_array
+        return self._dispatch_flux(distribution, coord_grids, distribution_id=distribution_id)
+
+    def bind(self, *coords_arrays: np.ndarray) -> Callable[[Distribution], float]:
+        """
+        Pre-computes everything about this shape and its coordinates that does not
+        depend on the distribution, and returns a fast flux function.
+
+        The returned callable `f(distribution)` returns the same flux as
+        `get_flux(distribution, *coords_arrays)`, but without re-validating coordinates,
+        hashing cache keys or storing intensity values on every call. This is intended
+        for optimizer loops that build a new distribution on every iteration.
+
+        Args:
+            *coords_arrays (np.ndarray): Coordinate arrays, as for `get_flux`.
+
+        Returns:
+            Callable[[Distribution], float]: The flux of a given distribution.
+
+        Raises:
+            ValueError: If the number or shape of `coords_arrays` is incorrect.
+        """
+        coord_grids = self._prepare_coord_grids(coords_arrays)
+
+        if not self.is_closed:
+            # get_flux warns and returns 0.0 for shapes without an enclosed region
+            def flux_not_closed(distribution: Distribution) -> float:
+                return self.get_flux(distribution, *coords_arrays)
+            return flux_not_closed
+
+        # Gather the coordinate of every interior cell along each axis once
+        coords_at_interior = [c[idx] for c, idx in zip(coord_grids, self._interior_unravelled)]
+
+        def flux(distribution: Distribution) -> float:
+            if not isinstance(distribution, Distribution):
+                raise TypeError(
+                    "`distribution` must be an instance of the `Distribution` class.")
+            return self._dispatch_flux(distribution, coord_grids,
+                                       coords_at_interior=coords_at_interior)
+
+        return flux
+
+    def _dispatch_flux(self, distribution: Distribution, coord_grids: list,
+                       distribution_id: Optional[Tuple[Any, ...]] = None,
+                       coords_at_interior: Optional[list] = None) -> float:
+        """
+        Computes the flux over the enclosed region with the cheapest evaluation the
+        distribution supports. Shared by `get_flux` and `bind`:
+
+        1. Separable distributions are contracted against the interior mask straight
+           from their 1D factors.
+        2. Axis-aligned Gaussians without separable factors (NormalDistribution1D, or
+           distributions that only define `_numba_kernel`) are summed by a fused
+           compiled kernel.
+        3. Anything else is evaluated at the interior cells only.
+
+        Shapes created with `quantize=True` skip these steps and always sum the
+        quantized full grid.
+
+        `get_flux` passes the `distribution_id` of the setup, which is recorded as the
+        current one, and step 3 goes through the intensity and flux caches. `bind`
+        passes the pre-gathered `coords_at_interior` instead, so nothing is hashed or
+        stored unless the distribution needs the element-wise fallback.
+        """
+        if self._quantize:
+            # Quantized shapes always sum the int16 grid, so the flux does not depend
+            # on whether `fill_intensity_array` ran first.
+            if distribution_id is None:
+                distribution_id = self._make_distribution_id(distribution, coord_grids)
+            if (self._intensity_array is None or self._current_distribution_id != distribution_id
+                    or distribution_id[2][1] is _UNCACHEABLE):
+                self._fill_intensity_array(distribution, coord_grids, distribution_id)
+            return self._get_flux_internal(distribution_id)
+
+        # 1. and 2. compute the flux without storing any intensity values
+        components = distribution.components()
+        if components is not None and len(components) == self.dimensions:
+            if distribution_id is not None:
+                self._set_current(distribution_id, distribution, coord_grids)
+            return self._separable_flux(components, coord_grids)
+
+        kernel_params = distribution._numba_kernel() if NUMBA_AVAILABLE else None
+        if kernel_params is not None and kernel_params[0].size == self.dimensions:
+            if distribution_id is not None:
+                self._set_current(distribution_id, distribution, coord_grids)
+            return float(gaussian_flux_nd(
+                self._interior_unravelled_2d,
+                tuple(np.ascontiguousarray(c, dtype=np.float64) for c in coord_grids),
+                *kernel_params,
+            ))
+
+        if coords_at_interior is not None:
+            try:
+                vectorized = self._supports_vectorized(distribution)
+            except (TypeError, ValueError, IndexError, AttributeError):
+                vectorized = False
+            if vectorized:
+                values = np.asarray(distribution(*coords_at_interior), dtype=self._dtype)
+                # A constant result still counts once per interior cell
+                values = np.broadcast_to(values, (self._interior_indices.size,))
+                return float(values.sum(dtype=np.float64))
+            distribution_id = self._make_distribution_id(distribution, coord_grids)
+
+        # 3. Evaluate the distribution at the interior cells only, unless the current
+        # values already hold exactly this setup or a full grid for it is cached.
+        # Identity-based IDs cannot tell whether the distribution changed, so they
+        # are always re-evaluated.
+        if (not self._has_intensity() or self._current_distribution_id != distribution_id
+                or distribution_id[2][1] is _UNCACHEABLE):
+            if distribution_id in self._intensity_cache:
+                self._fill_intensity_array(distribution, coord_grids, distribution_id)
+            else:
+                self._evaluate_interior(distribution, coord_grids, distribution_id)
+
+        # Retrieve flux from cache using the unique distribution ID
         return self._get_flux_internal(self._current_distribution_id)
 
+    def _separable_flux(self, components: list, coord_grids: list) -> float:
+        """
+        Flux of a separable distribution: the interior mask contracted with each
+        axis' 1D factor, e.g. sum_ij mask[i, j] * f_x(x_i) * f_y(y_j) in 2D.
+
+        `np.einsum` streams over the mask in buffered chunks, so neither an intensity
+        grid nor a gathered interior vector is allocated, and the factors need only
+        O(sum(dims)) evaluations.
+        """
+        operands = [self._interior_mask, list(range(self.dimensions))]
+        for axis, (comp, c) in enumerate(zip(components, coord_grids)):
+            operands += [np.asarray(comp(c), dtype=np.float64), [axis]]
+        return float(np.einsum(*operands, []))
+
+    def _has_intensity(self) -> bool:
+        """
+        Whether intensity values (full grid or interior only) are currently populated.
+        """
+        return self._intensity_array is not None or self._intensity_interior is not None
+
     def get_enclosed_intensity_array(self) -> np.ndarray:
         """
         Returns an array showing the intensity values only within the enclosed region,
-        with 0s elsewhere. Requires `fill_intensity_array` to have been called.
+        with 0s elsewhere. Requires `fill_intensity_array` or `get_flux` to have been called.
 
         Returns:
             np.ndarray: An array of the same shape as the original, with intensity values
@@ -284,9 +744,10 @@ class NdShape:
                         Returns an array of zeros if the shape is not closed.
 
         Raises:
-            RuntimeError: If `fill_intensity_array` has not been called prior to this method.
+            RuntimeError: If neither `fill_intensity_array` nor `get_flux` has been called
+                          prior to this method.
         """
-        if self._intensity_array is None:
+        if self._current_setup is None:
             raise RuntimeError(
                 "Intensity array not filled. Call `fill_intensity_array` first.")
 
@@ -295,28 +756,46 @@ class NdShape:
                 "Shape is not closed. No defined enclosed region to visualize.")
             return np.zeros_like(self._shape_array, dtype=float)
 
-        filled_array = scipy.ndimage.binary_fill_holes(self._shape_array)
-        # Identify interior points: where filled_array is 1 AND original shape_array was 0
-        interior_mask = (filled_array == 1) & (self._shape_array == 0)
-
-        enclosed_intensity = np.zeros_like(self._intensity_array, dtype=float)
-        enclosed_intensity[interior_mask] = self._intensity_array[interior_mask]
+        enclosed_intensity = np.zeros(self._shape_array.shape, dtype=float)
+        if self._intensity_interior is not None:
+            enclosed_intensity.flat[self._interior_indices] = self._intensity_interior
+        else:
+            self._materialize_intensity_array()
+            interior_mask = self._interior_mask
+            enclosed_intensity[interior_mask] = self._intensity_array[interior_mask]
+            if self._intensity_scale is not None:
+                enclosed_intensity *= self._intensity_scale
         return enclosed_intensity
 
+    def _materialize_intensity_array(self) -> None:
+        """
+        Fills the full `_intensity_array` for the current setup if `get_flux` only
+        evaluated the interior cells (or computed the flux without storing values).
+        """
+        if self._intensity_array is None:
+            self._fill_intensity_array(*self._current_setup, self._current_distribution_id)
+
     def get_full_intensity_array(self) -> np.ndarray:
         """
-        Returns the full intensity array computed by the last call to `fill_intensity_array`.
-        This array contains intensity values for all points in the domain, not just the enclosed region.
+        Returns the full intensity array for the distribution last used by
+        `fill_intensity_array` or `get_flux`. This array contains intensity values for all
+        points in the domain, not just the enclosed region. Since `get_flux` only evaluates
+        interior cells, the full grid is computed here on first request.
 
         Returns:
             np.ndarray: The full intensity array.
 
         Raises:
-            RuntimeError: If `fill_intensity_array` has not been called prior to this method.
+            RuntimeError: If neither `fill_intensity_array` nor `get_flux` has been called
+                          prior to this method.
         """
-        if self._intensity_array is None:
+        if self._current_setup is None:
             raise RuntimeError(
                 "Intensity array not filled. Call `fill_intensity_array` first.")
+        self._materialize_intensity_array()
+        if self._intensity_scale is not None:
+            # Dequantize; this also returns a new array
+            return self._intensity_array * self._intensity_scale
         # Return a copy to prevent external modification
         return self._intensity_array.copy()
 
@@ -327,7 +806,7 @@ class NdShape:
         closed_status = self.is_closed
 
         flux_info = "N/A (call .get_flux() to compute)"
-        if self._intensity_array is not None:
+        if self._current_setup is not None:
             # _current_distribution_id is a tuple (name, normalize, coord_hashes)
             flux_info = f"Intensity filled with '{self._current_distribution_id[0]}'" + \
                 (" (normalized)" if self._current_distribution_id[1] else "")
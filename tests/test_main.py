@@ -2,12 +2,15 @@ import pytest
 import numpy as np
 
 # Adjust the import path based on your project structure
+from Fluxed import _kernels, distributions, shapes
 from Fluxed.shapes import NdShape
 from Fluxed.distributions import (
     Distribution,
     UniformDistribution,
+    NormalDistribution1D,
     NormalDistribution2D,
-    LinearDistribution1D
+    LinearDistribution1D,
+    LinearDistribution2D
 )
 from Fluxed.match import match_flux_parameters
 
@@ -53,6 +56,17 @@ def hollow_3d_cube() -> NdShape:
 class TestNdShape:
     """Tests for the core NdShape class functionality."""
 
+    @pytest.mark.parametrize("bad_array", [
+        np.array([0, 1, 2]),
+        np.array([-1, 0, 1]),
+        np.array([0.0, 0.5, 1.0]),
+        np.array([0, 256], dtype=np.int64),
+        np.array([0, 255], dtype=np.uint8),
+    ])
+    def test_rejects_non_binary_arrays(self, bad_array):
+        with pytest.raises(ValueError):
+            NdShape(bad_array)
+
     def test_is_closed(self, closed_2d_shape, open_2d_shape, solid_shape):
         assert closed_2d_shape.is_closed is True
         assert open_2d_shape.is_closed is False
@@ -94,6 +108,235 @@ class TestNdShape:
 
         assert np.array_equal(intensity_array, expected)
 
+    def test_broadcast_fill_matches_meshgrid(self, closed_2d_shape):
+        """Filling from open grids must match evaluation on a dense meshgrid."""
+        dist = NormalDistribution2D(mean_x=2.0, mean_y=1.5, stddev_x=1.0, stddev_y=2.0)
+        x = np.linspace(0.0, 4.0, 5)
+        y = np.linspace(-1.0, 3.0, 5)
+        closed_2d_shape.fill_intensity_array(dist, x, y)
+
+        X, Y = np.meshgrid(x, y, indexing='ij')
+        assert np.allclose(closed_2d_shape.get_full_intensity_array(), dist(X, Y))
+
+    def test_intensity_cache_reuse_and_invalidate(self, closed_2d_shape):
+        """Equal distribution parameters reuse the cached intensity array."""
+        closed_2d_shape.fill_intensity_array(NormalDistribution2D(2.0, 2.0, 1.0, 1.0))
+        first = closed_2d_shape._intensity_array
+
+        closed_2d_shape.fill_intensity_array(NormalDistribution2D(2.0, 2.0, 1.0, 1.0))
+        assert closed_2d_shape._intensity_array is first
+
+        # Different parameters must not hit the cache
+        closed_2d_shape.fill_intensity_array(NormalDistribution2D(2.0, 2.0, 2.0, 1.0))
+        assert closed_2d_shape._intensity_array is not first
+
+        closed_2d_shape.invalidate_cache()
+        closed_2d_shape.fill_intensity_array(NormalDistribution2D(2.0, 2.0, 1.0, 1.0))
+        assert closed_2d_shape._intensity_array is not first
+        assert np.allclose(closed_2d_shape._intensity_array, first)
+
+    def test_unhashable_parameters_are_re_evaluated(self, closed_2d_shape):
+        """Distributions keyed by identity are not reused after an in-place change."""
+        class Weighted(Distribution):
+            def __init__(self):
+                super().__init__("Weighted", lambda x, y: self.weights[0] + 0 * x)
+                self.weights = np.array([1.0])
+
+        dist = Weighted()
+        assert closed_2d_shape.get_flux(dist) == 9.0
+        dist.weights[0] = 7
+        assert closed_2d_shape.get_flux(dist) == 63.0
+
+    def test_flux_cache_is_bounded(self, closed_2d_shape):
+        """Each shape keeps only a bounded number of cached fluxes."""
+        for i in range(50):
+            assert closed_2d_shape.get_flux(UniformDistribution(float(i))) == 9.0 * i
+        assert 0 < len(closed_2d_shape._flux_cache) <= 8
+        assert len(closed_2d_shape._intensity_cache) <= 8
+
+    def test_cache_distinguishes_closure_parameters(self):
+        """Custom distributions whose function captures parameters are not mixed up."""
+        class MyExp(Distribution):
+            def __init__(self, k):
+                super().__init__("MyExp", lambda x, y: np.exp(-k * x))
+                self.domain = ((0.0, 1.0), (0.0, 1.0))
+
+        shape = NdShape(np.array([[1, 1, 1], [1, 0, 1], [1, 0, 1], [1, 1, 1]]))
+        assert np.isclose(shape.get_flux(MyExp(1.0)), np.exp(-1.0) + np.exp(-2.0))
+        assert np.isclose(shape.get_flux(MyExp(2.0)), np.exp(-2.0) + np.exp(-4.0))
+
+    def test_invalidate_cache_after_shape_mutation(self):
+        """invalidate_cache recomputes the enclosed region of a mutated shape array."""
+        border = np.ones((5, 5), dtype=bool)
+        border[1:4, 1:4] = False
+        shape = NdShape(border)
+        assert shape.get_flux(UniformDistribution(1.0)) == 9.0
+
+        border[2, 2] = True
+        shape.invalidate_cache()
+        assert shape.get_flux(UniformDistribution(1.0)) == 8.0
+
+        border[:] = False
+        shape.invalidate_cache()
+        assert not shape.is_closed
+
+    def test_separable_fill_matches_dense(self, closed_2d_shape):
+        """The outer-product path for NormalDistribution2D matches dense evaluation."""
+        dist = NormalDistribution2D(mean_x=1.0, mean_y=3.0, stddev_x=0.5, stddev_y=1.5)
+        assert dist.components() is not None
+        closed_2d_shape.fill_intensity_array(dist)
+
+        X, Y = np.meshgrid(np.arange(5), np.arange(5), indexing='ij')
+        assert np.allclose(closed_2d_shape.get_full_intensity_array(), dist.func(X, Y))
+
+    def test_float32_intensity_dtype(self):
+        """A float32 intensity array still gives a float64-accumulated flux."""
+        border = np.ones((5, 5), dtype=int)
+        border[1:4, 1:4] = 0
+        shape = NdShape(border, dtype=np.float32)
+        dist = NormalDistribution2D(mean_x=2.0, mean_y=2.0)
+
+        flux32 = shape.get_flux(dist)
+        assert shape.get_full_intensity_array().dtype == np.float32
+        assert np.isclose(flux32, NdShape(border).get_flux(dist), rtol=1e-6)
+
+        with pytest.raises(ValueError):
+            NdShape(border, dtype=int)
+
+    def test_get_flux_evaluates_interior_only(self, hollow_3d_cube):
+        """get_flux only passes the enclosed cells to the distribution."""
+        seen_sizes = []
+
+        def counting_func(x, y, z):
+            seen_sizes.append(np.size(x))
+            return x + y + z
+
+        dist = Distribution("Counting", counting_func)
+        flux = hollow_3d_cube.get_flux(dist)
+
+        # The last call is the real evaluation; earlier ones are the vectorization probe
+        assert seen_sizes[-1] == 27
+        idx = np.arange(1, 4)
+        assert flux == 27 * 3 * idx.mean()
+
+        # The full grid is still available on request
+        full = hollow_3d_cube.get_full_intensity_array()
+        X, Y, Z = np.meshgrid(*(np.arange(5),) * 3, indexing='ij')
+        assert np.array_equal(full, X + Y + Z)
+
+    def test_separable_flux_matches_dense_sum(self, closed_2d_shape):
+        """The einsum flux path for separable distributions agrees with a dense masked sum."""
+        dist = NormalDistribution2D(mean_x=1.5, mean_y=2.5, stddev_x=0.8, stddev_y=1.3)
+        x = np.linspace(-1.0, 1.0, 5)
+        y = np.linspace(0.0, 4.0, 5)
+        flux = closed_2d_shape.get_flux(dist, x, y)
+
+        X, Y = np.meshgrid(x, y, indexing='ij')
+        expected = dist.func(X, Y)[1:4, 1:4].sum()
+        assert np.isclose(flux, expected)
+        # Intensities can still be inspected after a flux computed from the factors
+        assert np.isclose(closed_2d_shape.get_enclosed_intensity_array().sum(), expected)
+
+    def test_bind_matches_get_flux(self, hollow_3d_cube):
+        """A bound flux function returns the same flux as get_flux."""
+        class ZLinear(LinearDistribution1D):
+            def __call__(self, x, y, z): return self.func(z)
+
+        coords = (np.linspace(0, 1, 5),) * 3
+        flux_fn = hollow_3d_cube.bind(*coords)
+        expected = hollow_3d_cube.get_flux(ZLinear(slope=2.0, intercept=0.5), *coords)
+        assert np.isclose(flux_fn(ZLinear(slope=2.0, intercept=0.5)), expected)
+
+        uniform_fn = hollow_3d_cube.bind()
+        assert uniform_fn(UniformDistribution(2.0)) == 54.0
+
+    def test_quantized_intensity_array(self, hollow_3d_cube):
+        """Quantized grids are stored as int16 and reproduce the float flux."""
+        border = hollow_3d_cube.shape_array
+        quantized = NdShape(border, quantize=True)
+
+        class ZLinear(LinearDistribution1D):
+            def __call__(self, x, y, z): return self.func(z)
+
+        dist = ZLinear(slope=-2.0, intercept=3.0)
+        quantized.fill_intensity_array(dist)
+        assert quantized._intensity_array.dtype == np.int16
+
+        reference = NdShape(border)
+        reference.fill_intensity_array(dist)
+        assert np.allclose(quantized.get_full_intensity_array(),
+                           reference.get_full_intensity_array(), atol=1e-3)
+        assert np.isclose(quantized.get_enclosed_intensity_array().sum(),
+                          reference.get_enclosed_intensity_array().sum(), rtol=1e-4)
+
+        # get_flux sums the int16 grid whether or not it was filled first
+        flux = quantized.get_flux(dist)
+        assert np.isclose(flux, reference.get_flux(dist), rtol=1e-4)
+        fresh = NdShape(border, quantize=True)
+        assert fresh.get_flux(dist) == flux
+        assert fresh._intensity_array.dtype == np.int16
+        fresh.fill_intensity_array(dist)
+        assert fresh.get_flux(dist) == flux
+
+    def test_flux_after_in_place_coordinate_change(self, closed_2d_shape):
+        """Changing a coordinate array in place gives a new flux, not a cached one."""
+        x = np.arange(5, dtype=float)
+        y = np.arange(5, dtype=float)
+        dist = LinearDistribution2D(1, 1, 0, 0)
+        assert closed_2d_shape.get_flux(dist, x, y) == 36.0
+        assert closed_2d_shape.get_flux(dist, x, y) == 36.0
+
+        x += 10
+        assert closed_2d_shape.get_flux(dist, x, y) == 126.0
+
+    def test_gaussian_kernels_3d(self, hollow_3d_cube, monkeypatch):
+        """A 3D axis-aligned Gaussian fills the grid and sums its flux like its NumPy definition."""
+        means = np.array([1.0, 2.0, 3.0])
+        stddevs = np.array([0.5, 1.0, 2.0])
+
+        class Normal3D(Distribution):
+            def __init__(self):
+                def normal_func(x, y, z):
+                    return np.prod(
+                        [NormalDistribution1D(m, sd)(c) for m, sd, c in zip(means, stddevs, (x, y, z))],
+                        axis=0)
+                super().__init__("Normal3D", normal_func)
+
+            def _numba_kernel(self):
+                return means, 0.5 / stddevs**2, 1.0 / (stddevs * np.sqrt(2 * np.pi))
+
+        dist = Normal3D()
+        hollow_3d_cube.fill_intensity_array(dist)
+        X, Y, Z = np.meshgrid(*(np.arange(5),) * 3, indexing='ij')
+        assert np.allclose(hollow_3d_cube.get_full_intensity_array(), dist.func(X, Y, Z))
+
+        # Without separable factors, the flux goes through the fused kernel when
+        # Numba is available
+        kernel_calls = []
+
+        def counting_kernel(*args):
+            kernel_calls.append(args)
+            return _kernels.gaussian_flux_nd(*args)
+
+        monkeypatch.setattr(shapes, "gaussian_flux_nd", counting_kernel)
+        flux = NdShape(hollow_3d_cube.shape_array).get_flux(dist)
+        assert np.isclose(flux, dist.func(X, Y, Z)[1:4, 1:4, 1:4].sum())
+        assert len(kernel_calls) == (1 if _kernels.NUMBA_AVAILABLE else 0)
+
+    def test_gaussian_kernels_match_numpy_after_attribute_change(self, closed_2d_shape):
+        """Compiled and NumPy paths evaluate the Gaussian captured at construction."""
+        shape_1d = NdShape(np.array([1, 0, 0, 0, 1]))
+        dist_1d = NormalDistribution1D(mean=1.0, stddev=0.8)
+        dist_1d.mean = 2.0
+        assert np.isclose(shape_1d.get_flux(dist_1d), dist_1d(np.arange(5))[1:4].sum())
+
+        dist_2d = NormalDistribution2D(mean_x=1.0, mean_y=2.0, stddev_x=0.7, stddev_y=1.2)
+        dist_2d.mean_x = 3.0
+        closed_2d_shape.fill_intensity_array(dist_2d)
+        X, Y = np.meshgrid(np.arange(5), np.arange(5), indexing='ij')
+        assert np.allclose(closed_2d_shape.get_full_intensity_array(), dist_2d(X, Y))
+        assert np.isclose(closed_2d_shape.get_flux(dist_2d), dist_2d(X, Y)[1:4, 1:4].sum())
+
     def test_1d_shape_flux(self):
         """Test a simple 1D case."""
         shape_1d = NdShape(np.array([1, 0, 0, 0, 1]))
@@ -122,6 +365,43 @@ class TestDistributions:
             assert isinstance(result, np.ndarray)
             assert result.shape == expected_shape
 
+    def test_normal1d_vectorized_matches_formula(self):
+        """NormalDistribution1D should evaluate a whole array in one call."""
+        mean, stddev = 1.5, 0.7
+        x = np.linspace(-2.0, 5.0, 11)
+        expected = np.exp(-0.5 * ((x - mean) / stddev) ** 2) / \
+            (stddev * np.sqrt(2 * np.pi))
+        result = NormalDistribution1D(mean=mean, stddev=stddev)(x)
+        assert result.shape == x.shape
+        assert np.allclose(result, expected)
+
+    @pytest.mark.parametrize("dtype", [np.float64, np.float32])
+    def test_normal_numexpr_path_matches_numpy(self, monkeypatch, dtype):
+        """The numexpr branch gives the values and dtype of the np.exp branch."""
+        pytest.importorskip("numexpr")
+        x = np.linspace(-2.0, 5.0, 50, dtype=dtype)
+        y = np.linspace(0.0, 3.0, 50, dtype=dtype)
+        dist_1d = NormalDistribution1D(mean=1.5, stddev=0.7)
+        dist_2d = NormalDistribution2D(mean_x=1.0, mean_y=2.0, stddev_x=0.8, stddev_y=1.2)
+        expected_1d, expected_2d = dist_1d(x), dist_2d(x, y)
+
+        monkeypatch.setattr(distributions, "_NUMEXPR_MIN_SIZE", 0)
+        assert distributions._use_numexpr(x)
+        for result, expected in ((dist_1d(x), expected_1d), (dist_2d(x, y), expected_2d)):
+            assert result.dtype == expected.dtype == dtype
+            assert np.allclose(result, expected, rtol=1e-6)
+
+    @pytest.mark.parametrize("make_dist", [
+        lambda: NormalDistribution1D(stddev=0.0),
+        lambda: NormalDistribution1D(stddev=-1.0),
+        lambda: NormalDistribution2D(stddev_x=0.0),
+        lambda: NormalDistribution2D(stddev_y=-0.5),
+    ])
+    def test_normal_rejects_non_positive_stddev(self, make_dist):
+        """Normal distributions raise a ValueError for a stddev that is not positive."""
+        with pytest.raises(ValueError):
+            make_dist()
+
 
 class TestFluxMatcher:
     """Integration tests for the match_flux_parameters function."""
@@ -215,3 +495,19 @@ class TestFluxMatcher:
         # The optimizer may report "success" if it finds a local minimum,
         # but the final flux will NOT match the target. This is the key check.
         assert not np.isclose(result['final_flux'], result['target_flux'])
+
+    @pytest.mark.filterwarnings("error")
+    def test_flux_errors_are_not_treated_as_invalid_parameters(self, closed_2d_shape):
+        """Errors while evaluating the flux propagate instead of becoming a penalty."""
+        class Broken(UniformDistribution):
+            def __call__(self, *args): raise NameError("undefined_name")
+
+        with pytest.raises(NameError):
+            match_flux_parameters(
+                source_shape=closed_2d_shape,
+                source_dist=UniformDistribution(value=1.0),
+                target_shape=closed_2d_shape,
+                TargetDistClass=Broken,
+                param_names=['value'],
+                initial_guess=[2.0],
+            )